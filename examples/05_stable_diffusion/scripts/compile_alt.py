@@ -97,7 +97,7 @@ def compile_diffusers(
     # CLIP
     compile_clip(
         pipe.text_encoder,
-        batch_size=batch_size,
+        batch_size=(batch_size[0], batch_size[1] * 2),  # uncond + cond in one batch
         seqlen=77,
         use_fp16_acc=use_fp16_acc,
         convert_conv_to_gemm=convert_conv_to_gemm,
@@ -14,6 +14,7 @@
 #
 import inspect
 import os
+from collections import OrderedDict
 from typing import List, Optional, Union
 
 import torch
@@ -34,28 +35,29 @@ from .modeling.vae import AutoencoderKL as ait_AutoencoderKL
 from .pipeline_utils import convert_ldm_unet_checkpoint, convert_ldm_vae_checkpoint, map_clip_state_dict, map_unet_state_dict
 
 
+_PARAM_NAME_TABLE = str.maketrans(".", "_")
+
+
+@torch.no_grad()
 def map_controlnet_params(pt_mod):
-    pt_params = dict(pt_mod.named_parameters())
+    # parameters stay on the module's device; no_grad keeps the permutes
+    # from recording autograd history
     params_ait = {}
-    for key, arr in pt_params.items():
-        if len(arr.shape) == 4:
+    for key, arr in pt_mod.named_parameters():
+        ait_key = key.translate(_PARAM_NAME_TABLE)
+        if arr.ndim == 4:
             arr = arr.permute((0, 2, 3, 1)).contiguous()
-        elif key.endswith("ff.net.0.proj.weight"):
+        elif key.endswith(("ff.net.0.proj.weight", "ff.net.0.proj.bias")):
             w1, w2 = arr.chunk(2, dim=0)
-            params_ait[key.replace(".", "_")] = w1
-            params_ait[key.replace(".", "_").replace("proj", "gate")] = w2
+            params_ait[ait_key] = w1
+            params_ait[ait_key.replace("proj", "gate")] = w2
             continue
-        elif key.endswith("ff.net.0.proj.bias"):
-            w1, w2 = arr.chunk(2, dim=0)
-            params_ait[key.replace(".", "_")] = w1
-            params_ait[key.replace(".", "_").replace("proj", "gate")] = w2
-            continue
-        params_ait[key.replace(".", "_")] = arr
+        params_ait[ait_key] = arr
     params_ait["controlnet_cond_embedding_conv_in_weight"] = torch.nn.functional.pad(
         params_ait["controlnet_cond_embedding_conv_in_weight"], (0, 1, 0, 0, 0, 0, 0, 0)
     )
-    params_ait["arange"] = (
-        torch.arange(start=0, end=320 // 2, dtype=torch.float32).to(torch.device(0)).half()
+    params_ait["arange"] = torch.arange(
+        start=0, end=320 // 2, dtype=torch.float16, device=torch.device(0)
     )
     return params_ait
 
@@ -63,6 +65,10 @@ def map_controlnet_params(pt_mod):
 class StableDiffusionAITPipeline:
     def __init__(self, hf_hub_or_path, ckpt, workdir="tmp/"):
         self.device = torch.device(0)
+        # speed up the remaining PyTorch ops (scheduler, pre/post-processing)
+        torch.backends.cudnn.benchmark = True
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
         if ckpt is not None:
             state_dict = torch.load(ckpt, map_location="cpu")
             while "state_dict" in state_dict:
@@ -70,19 +76,17 @@ class StableDiffusionAITPipeline:
             clip_state_dict = {}
             unet_state_dict = {}
             vae_state_dict = {}
-            for key in state_dict.keys():
-                if key.startswith("cond_stage_model.transformer."):
-                    new_key = key.replace("cond_stage_model.transformer.", "")
-                    clip_state_dict[new_key] = state_dict[key]
-                elif key.startswith("cond_stage_model.model."):
-                    new_key = key.replace("cond_stage_model.model.", "")
-                    clip_state_dict[new_key] = state_dict[key]
-                elif key.startswith("first_stage_model."):
-                    new_key = key.replace("first_stage_model.", "")
-                    vae_state_dict[new_key] = state_dict[key]
-                elif key.startswith("model.diffusion_model."):
-                    new_key = key.replace("model.diffusion_model.", "")
-                    unet_state_dict[new_key] = state_dict[key]
+            routes = (
+                ("cond_stage_model.transformer.", clip_state_dict),
+                ("cond_stage_model.model.", clip_state_dict),
+                ("first_stage_model.", vae_state_dict),
+                ("model.diffusion_model.", unet_state_dict),
+            )
+            for key, value in state_dict.items():
+                for prefix, target in routes:
+                    if key.startswith(prefix):
+                        target[key[len(prefix):]] = value
+                        break
             # TODO: SD2.x clip support, get from diffusers convert_from_ckpt.py
             # clip_state_dict = convert_text_enc_state_dict(clip_state_dict)
             unet_state_dict = convert_ldm_unet_checkpoint(unet_state_dict)
@@ -97,6 +101,9 @@ class StableDiffusionAITPipeline:
         ait_params = map_controlnet_params(controlnet_pt)
         self.controlnet_ait_exe.set_many_constants_with_tensors(ait_params)
         self.controlnet_ait_exe.fold_constants()
+        self._ctrl_ys = self._allocate_outputs(self.controlnet_ait_exe)
+        # fed to the UNet once ControlNet conditioning has ended
+        self._ctrl_zeros = [torch.zeros_like(y) for y in self._ctrl_ys]
         self.clip_ait_exe = self.init_ait_module(
             model_name="CLIPTextModel", workdir=workdir
         )
@@ -119,6 +126,7 @@ class StableDiffusionAITPipeline:
         self.clip_ait_exe.set_many_constants_with_tensors(clip_params_ait)
         print("Folding constants")
         self.clip_ait_exe.fold_constants()
+        self._clip_ys = self._allocate_outputs(self.clip_ait_exe)
         # cleanup
         del self.clip_pt
         del clip_params_ait
@@ -209,7 +217,24 @@ class StableDiffusionAITPipeline:
         self.scheduler = EulerDiscreteScheduler.from_pretrained(
             "runwayml/stable-diffusion-v1-5", subfolder="scheduler"
         )
+        # scheduler signatures don't change between calls, introspect them once
+        self._accepts_offset = "offset" in set(
+            inspect.signature(self.scheduler.set_timesteps).parameters.keys()
+        )
+        step_params = set(inspect.signature(self.scheduler.step).parameters.keys())
+        self._accepts_eta = "eta" in step_params
+        self._accepts_generator = "generator" in step_params
+        # memoize tokenization of the last few prompts
+        self._token_cache = OrderedDict()
         self.batch = 1
+        # persistent input/output buffers, only reallocated when the shape changes
+        self._input_buffers = {}
+        self._output_buffers = {}
+        # ControlNet and UNet run on their own streams; UNet waits on
+        # `_ctrl_done` instead of the host synchronizing after ControlNet
+        self._stream_ctrl = torch.cuda.Stream(device=self.device)
+        self._stream_unet = torch.cuda.Stream(device=self.device)
+        self._ctrl_done = torch.cuda.Event()
 
     def init_ait_module(
             self,
@@ -219,27 +244,84 @@ class StableDiffusionAITPipeline:
         mod = Model(os.path.join(workdir, model_name, "test.so"))
         return mod
 
+    def tokenize(self, prompts):
+        return self.tokenizer(
+            list(prompts),
+            padding="max_length",
+            max_length=self.tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="pt",
+        ).input_ids
+
+    def _cached_tokenize(self, prompts, maxsize=4):
+        input_ids = self._token_cache.get(prompts)
+        if input_ids is None:
+            input_ids = self.tokenize(prompts)
+            self._token_cache[prompts] = input_ids
+            if len(self._token_cache) > maxsize:
+                self._token_cache.popitem(last=False)
+        else:
+            self._token_cache.move_to_end(prompts)
+        return input_ids
+
+    def _allocate_outputs(self, exe_module, shape_override=None):
+        """Allocates fp16 output buffers of the maximum output shapes.
+
+        `shape_override` replaces the leading dims of every output shape.
+        """
+        ys = []
+        num_outputs = len(exe_module.get_output_name_to_index_map())
+        for i in range(num_outputs):
+            shape = exe_module.get_output_maximum_shape(i)
+            if shape_override is not None:
+                shape[: len(shape_override)] = shape_override
+            ys.append(torch.empty(shape, dtype=torch.float16, device=self.device))
+        return ys
+
+    def _get_outputs(self, name, exe_module, shape_override):
+        """Returns the cached output buffers for `name`.
+
+        Only one set is kept per module; it is reallocated when the shape changes.
+        """
+        cached = self._output_buffers.get(name)
+        if cached is None or cached[0] != shape_override:
+            cached = (shape_override, self._allocate_outputs(exe_module, shape_override))
+            self._output_buffers[name] = cached
+        return cached[1]
+
+    def _stage_input(self, name, tensor, dtype=torch.float16):
+        """Copies `tensor` into a persistent device buffer and returns the buffer.
+
+        The buffer is only reallocated when the shape changes.
+        """
+        buf = self._input_buffers.get(name)
+        if buf is None or buf.shape != tensor.shape:
+            buf = torch.empty(tensor.shape, dtype=dtype, device=self.device)
+            self._input_buffers[name] = buf
+        buf.copy_(tensor, non_blocking=True)
+        return buf
+
     def controlnet_inference(
             self, latent_model_input, timesteps, encoder_hidden_states, controlnet_cond
     ):
         exe_module = self.controlnet_ait_exe
-        timesteps_pt = timesteps.expand(latent_model_input.shape[0])
+        # latent_model_input, timesteps and encoder_hidden_states are fp16 device
+        # tensors (latents in NHWC) shared with `unet_inference`
         inputs = {
-            "input0": latent_model_input.permute((0, 2, 3, 1))
-            .contiguous()
-            .to(self.device)
-            .half(),
-            "input1": timesteps_pt.to(self.device).half(),
-            "input2": encoder_hidden_states.to(self.device).half(),
-            "input3": controlnet_cond.permute((0, 2, 3, 1)).contiguous().to(self.device).half(),
+            "input0": latent_model_input,
+            "input1": timesteps,
+            "input2": encoder_hidden_states,
+            # already converted to NHWC fp16 once per call in `__call__`
+            "input3": controlnet_cond,
         }
-        ys = []
-        num_outputs = len(exe_module.get_output_name_to_index_map())
-        for i in range(num_outputs):
-            shape = exe_module.get_output_maximum_shape(i)
-            ys.append(torch.empty(shape).to(self.device).half())
-        exe_module.run_with_tensors(inputs, ys, graph_mode=False)
-        down_block_residuals = (y for y in ys[:-1])
+        ys = self._ctrl_ys
+        stream = self._stream_ctrl
+        stream.wait_stream(torch.cuda.current_stream())
+        exe_module.run_with_tensors(
+            inputs, ys, stream_ptr=stream.cuda_stream, sync=False, graph_mode=True
+        )
+        self._ctrl_done.record(stream)
+        down_block_residuals = ys[:-1]
         mid_block_residuals = ys[-1]
         return down_block_residuals, mid_block_residuals
 
@@ -254,63 +336,52 @@ class StableDiffusionAITPipeline:
             mid_block_residual,
     ):
         exe_module = self.unet_ait_exe
-        timesteps_pt = timesteps.expand(self.batch * 2)
         inputs = {
-            "input0": latent_model_input.permute((0, 2, 3, 1))
-            .contiguous()
-            .to(self.device)
-            .half(),
-            "input1": timesteps_pt.to(self.device).half(),
-            "input2": encoder_hidden_states.to(self.device).half(),
+            "input0": latent_model_input,
+            "input1": timesteps,
+            "input2": encoder_hidden_states,
         }
         for i, y in enumerate(down_block_residuals):
             inputs[f"down_block_residual_{i}"] = y
         inputs["mid_block_residual"] = mid_block_residual
-        ys = []
-        num_outputs = len(exe_module.get_output_name_to_index_map())
-        for i in range(num_outputs):
-            shape = exe_module.get_output_maximum_shape(i)
-            shape[0] = self.batch * 2
-            shape[1] = height // 8
-            shape[2] = width // 8
-            ys.append(torch.empty(shape).to(self.device).half())
-        exe_module.run_with_tensors(inputs, ys, graph_mode=False)
-        noise_pred = ys[0].permute((0, 3, 1, 2)).float()
+        ys = self._get_outputs(
+            "unet", exe_module, [self.batch * 2, height // 8, width // 8]
+        )
+        stream = self._stream_unet
+        stream.wait_stream(torch.cuda.current_stream())
+        stream.wait_event(self._ctrl_done)
+        exe_module.run_with_tensors(
+            inputs, ys, stream_ptr=stream.cuda_stream, sync=False, graph_mode=True
+        )
+        # the scheduler step on the current stream consumes noise_pred
+        torch.cuda.current_stream().wait_stream(stream)
+        noise_pred = ys[0].permute((0, 3, 1, 2))
         return noise_pred
 
     def clip_inference(self, input_ids, seqlen=77):
         exe_module = self.clip_ait_exe
         bs = input_ids.shape[0]
-        position_ids = torch.arange(seqlen).expand((bs, -1)).to(self.device)
+        position_ids = torch.arange(seqlen).expand((bs, -1))
         inputs = {
-            "input0": input_ids,
-            "input1": position_ids,
+            "input0": self._stage_input("clip_input0", input_ids, dtype=torch.int64),
+            "input1": self._stage_input("clip_input1", position_ids, dtype=torch.int64),
         }
-        ys = []
-        num_outputs = len(exe_module.get_output_name_to_index_map())
-        for i in range(num_outputs):
-            shape = exe_module.get_output_maximum_shape(i)
-            shape[0] = self.batch
-            ys.append(torch.empty(shape).to(self.device).half())
-        exe_module.run_with_tensors(inputs, ys, graph_mode=False)
-        return ys[0].float()
+        # slicing the leading dim of the max-shape buffers keeps them contiguous
+        ys = [y[:bs] for y in self._clip_ys]
+        exe_module.run_with_tensors(inputs, ys, graph_mode=True)
+        return ys[0]
 
     def vae_inference(self, vae_input, height, width):
         exe_module = self.vae_ait_exe
-        inputs = [torch.permute(vae_input, (0, 2, 3, 1)).contiguous().to(self.device).half()]
-        ys = []
-        num_outputs = len(exe_module.get_output_name_to_index_map())
-        for i in range(num_outputs):
-            shape = exe_module.get_output_maximum_shape(i)
-            shape[0] = self.batch * 2
-            shape[1] = height
-            shape[2] = width
-            ys.append(torch.empty(shape).to(self.device).half())
-        exe_module.run_with_tensors(inputs, ys, graph_mode=False)
-        vae_out = ys[0].permute((0, 3, 1, 2)).float()
+        inputs = [
+            self._stage_input("vae_input0", torch.permute(vae_input, (0, 2, 3, 1)))
+        ]
+        ys = self._get_outputs("vae", exe_module, [self.batch * 2, height, width])
+        exe_module.run_with_tensors(inputs, ys, graph_mode=True)
+        vae_out = ys[0].permute((0, 3, 1, 2))
         return vae_out
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def __call__(
             self,
             prompt: Union[str, List[str]],
@@ -325,6 +396,9 @@ class StableDiffusionAITPipeline:
             latents: Optional[torch.FloatTensor] = None,
             output_type: Optional[str] = "pil",
             return_dict: bool = True,
+            controlnet_conditioning_end: float = 0.8,
+            cache_interval: int = 2,
+            cache_threshold: Optional[float] = None,
     ):
         r"""
         Function invoked when calling the pipeline for generation.
@@ -364,6 +438,15 @@ class StableDiffusionAITPipeline:
             return_dict (`bool`, *optional*, defaults to `True`):
                 Whether or not to return a [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] instead of a
                 plain tuple.
+            controlnet_conditioning_end (`float`, *optional*, defaults to 0.8):
+                Fraction of the denoising steps during which ControlNet is run. For the remaining steps the UNet
+                receives zero residuals and ControlNet is skipped.
+            cache_interval (`int`, *optional*, defaults to 2):
+                ControlNet is always run on every `cache_interval`-th step. On the steps in between, the residuals of
+                the last ControlNet run are reused. Set to 1 to disable.
+            cache_threshold (`float`, *optional*):
+                Maximum relative L1 change of the latents since the last ControlNet run for its residuals to be reused.
+                If not set, residuals are reused purely by `cache_interval`.
 
         Returns:
             [`~pipelines.stable_diffusion.StableDiffusionPipelineOutput`] or `tuple`:
@@ -387,19 +470,15 @@ class StableDiffusionAITPipeline:
                 f"`height` and `width` have to be divisible by 8 but are {height} and {width}."
             )
 
+        if cache_interval < 1:
+            raise ValueError(
+                f"`cache_interval` has to be a positive integer but is {cache_interval}."
+            )
+
         self.batch = batch_size
 
         # get prompt text embeddings
-        text_input = self.tokenizer(
-            prompt,
-            padding="max_length",
-            max_length=self.tokenizer.model_max_length,
-            truncation=True,
-            return_tensors="pt",
-        )
-        text_embeddings = self.clip_inference(text_input.input_ids.to(self.device))
-        # pytorch equivalent
-        # text_embeddings = self.clip_pt(text_input.input_ids.to(self.device)).last_hidden_state
+        prompts = (prompt,) if isinstance(prompt, str) else tuple(prompt)
 
         # here `guidance_scale` is defined analog to the guidance weight `w` of equation (2)
         # of the Imagen paper: https://arxiv.org/pdf/2205.11487.pdf . `guidance_scale = 1`
@@ -408,7 +487,6 @@ class StableDiffusionAITPipeline:
         # get unconditional embeddings for classifier free guidance
         if do_classifier_free_guidance:
             uncond_tokens: List[str]
-            max_length = text_input.input_ids.shape[-1]
             if negative_prompt is None:
                 uncond_tokens = [""] * batch_size
             elif type(prompt) is not type(negative_prompt):
@@ -426,21 +504,15 @@ class StableDiffusionAITPipeline:
                 )
             else:
                 uncond_tokens = negative_prompt
-            uncond_input = self.tokenizer(
-                uncond_tokens,
-                padding="max_length",
-                max_length=max_length,
-                truncation=True,
-                return_tensors="pt",
-            )
-            uncond_embeddings = self.clip_inference(
-                uncond_input.input_ids.to(self.device)
-            )
 
             # For classifier free guidance, we need to do two forward passes.
-            # Here we concatenate the unconditional and text embeddings into a single batch
-            # to avoid doing two forward passes
-            text_embeddings = torch.cat([uncond_embeddings, text_embeddings])
+            # Here we tokenize the unconditional and text prompts into a single batch
+            # so that CLIP only runs once and writes both into its preallocated output
+            prompts = tuple(uncond_tokens) + prompts
+        input_ids = self._cached_tokenize(prompts)
+        text_embeddings = self.clip_inference(input_ids)
+        # pytorch equivalent
+        # text_embeddings = self.clip_pt(input_ids.to(self.device)).last_hidden_state
 
         # get the initial random noise unless the user supplied it
 
@@ -450,27 +522,34 @@ class StableDiffusionAITPipeline:
         latents_device = self.device
         latents_shape = (batch_size, 4, height // 8, width // 8)
         if latents is None:
+            latents_generator = generator
+            if generator is not None and generator.device.type != latents_device.type:
+                # seed a generator on the device from the caller's generator so that
+                # noise is sampled there directly, while the caller's generator advances
+                seed = torch.randint(2**63 - 1, (1,), generator=generator).item()
+                latents_generator = torch.Generator(device=latents_device)
+                latents_generator.manual_seed(seed)
             latents = torch.randn(
                 latents_shape,
-                generator=generator,
+                generator=latents_generator,
                 device=latents_device,
+                dtype=torch.float16,
             )
         else:
             if latents.shape != latents_shape:
                 raise ValueError(
                     f"Unexpected latents shape, got {latents.shape}, expected {latents_shape}"
                 )
-        latents = latents.to(self.device)
+        latents = latents.to(self.device, torch.float16)
 
         # set timesteps
-        accepts_offset = "offset" in set(
-            inspect.signature(self.scheduler.set_timesteps).parameters.keys()
-        )
         extra_set_kwargs = {}
-        if accepts_offset:
+        if self._accepts_offset:
             extra_set_kwargs["offset"] = 1
 
         self.scheduler.set_timesteps(num_inference_steps, **extra_set_kwargs)
+        # cast all timesteps to fp16 on the device once instead of once per step
+        timesteps_dev = self.scheduler.timesteps.to(self.device, torch.float16)
 
         latents = latents * self.scheduler.init_noise_sigma
 
@@ -478,32 +557,59 @@ class StableDiffusionAITPipeline:
         # eta (η) is only used with the DDIMScheduler, it will be ignored for other schedulers.
         # eta corresponds to η in DDIM paper: https://arxiv.org/abs/2010.02502
         # and should be between [0, 1]
-        accepts_eta = "eta" in set(
-            inspect.signature(self.scheduler.step).parameters.keys()
-        )
         extra_step_kwargs = {}
-        if accepts_eta:
+        if self._accepts_eta:
             extra_step_kwargs["eta"] = eta
             # check if the scheduler accepts generator
-        accepts_generator = "generator" in set(
-            inspect.signature(self.scheduler.step).parameters.keys()
-        )
-        if accepts_generator:
+        if self._accepts_generator:
             extra_step_kwargs["generator"] = generator
 
-        for t in tqdm(self.scheduler.timesteps):
+        # control_cond is invariant across timesteps, convert it to NHWC fp16 once
+        control_cond = self._stage_input(
+            "controlnet_input3", control_cond.permute((0, 2, 3, 1))
+        )
+
+        controlnet_cutoff = int(num_inference_steps * controlnet_conditioning_end)
+
+        for step_idx, t in enumerate(tqdm(self.scheduler.timesteps)):
             # expand the latents if we are doing classifier free guidance
             latent_model_input = (
                 torch.cat([latents] * 2) if do_classifier_free_guidance else latents
             )
             latent_model_input = self.scheduler.scale_model_input(latent_model_input, t)
-            down_block_residuals, mid_block_residual = self.controlnet_inference(
-                latent_model_input, t, text_embeddings, control_cond
+            # convert to NHWC fp16 once and share it between ControlNet and UNet
+            latent_model_input = self._stage_input(
+                "latent_model_input", latent_model_input.permute((0, 2, 3, 1))
             )
+            timesteps_pt = self._stage_input(
+                "timesteps", timesteps_dev[step_idx].expand(latent_model_input.shape[0])
+            )
+            if step_idx < controlnet_cutoff:
+                # ControlNet residuals change slowly between adjacent steps, reuse
+                # them in between cache intervals if the latents barely moved
+                reuse_residuals = step_idx % cache_interval != 0
+                if reuse_residuals and cache_threshold:
+                    # strided subsample of the whole pre-CFG batch
+                    latent_sample = latents[:, :, ::4, ::4]
+                    reuse_residuals = (
+                        (latent_sample - ctrl_latent).abs().mean()
+                        / ctrl_latent.abs().mean()
+                    ).item() < cache_threshold
+                if not reuse_residuals:
+                    down_block_residuals, mid_block_residual = self.controlnet_inference(
+                        latent_model_input, timesteps_pt, text_embeddings, control_cond
+                    )
+                    if cache_threshold:
+                        ctrl_latent = self._stage_input(
+                            "controlnet_latent", latents[:, :, ::4, ::4]
+                        )
+            else:
+                down_block_residuals = self._ctrl_zeros[:-1]
+                mid_block_residual = self._ctrl_zeros[-1]
             # predict the noise residual
             noise_pred = self.unet_inference(
                 latent_model_input,
-                t,
+                timesteps_pt,
                 encoder_hidden_states=text_embeddings,
                 height=height,
                 width=width,
@@ -514,8 +620,9 @@ class StableDiffusionAITPipeline:
             # perform guidance
             if do_classifier_free_guidance:
                 noise_pred_uncond, noise_pred_text = noise_pred.chunk(2)
-                noise_pred = noise_pred_uncond + guidance_scale * (
-                        noise_pred_text - noise_pred_uncond
+                # uncond + scale * (text - uncond) as a single fused kernel
+                noise_pred = torch.lerp(
+                    noise_pred_uncond, noise_pred_text, guidance_scale
                 )
 
             latents = self.scheduler.step(
@@ -528,8 +635,13 @@ class StableDiffusionAITPipeline:
         # pytorch equivalent
         # image = self.vae_pt.decode(latents).sample
 
-        image = (image / 2 + 0.5).clamp(0, 1)
-        image = image.cpu().permute(0, 2, 3, 1).numpy()
+        # normalize in place on the fp16 VAE output; its NHWC storage makes the
+        # permute below a no-op, so the fp16 data is copied to the host as-is
+        # and only cast to fp32 there
+        image = image.mul_(0.5).add_(0.5).clamp_(0, 1)
+        image = image.permute(0, 2, 3, 1).to("cpu", non_blocking=True)
+        torch.cuda.synchronize()
+        image = image.float().numpy()
 
         has_nsfw_concept = None
 